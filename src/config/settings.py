@@ -1,6 +1,6 @@
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pydantic import Field
-from typing import Optional
+from typing import Literal, Optional
 import os
 from pathlib import Path
 import subprocess
@@ -49,6 +49,18 @@ class GitAgentSettings(BaseSettings):
     # Agent Configuration
     max_iterations: int = Field(default=10, description="Maximum agent iterations")
     temperature: float = Field(default=0.1, description="LLM temperature")
+    max_diff_bytes: int = Field(
+        default=32 * 1024,
+        description="Maximum bytes of staged diff excerpt sent to the LLM",
+    )
+    llm_skip_trivial: bool = Field(
+        default=True,
+        description="Template commit messages for trivial staged diffs instead of calling the LLM",
+    )
+    status_untracked_files: Literal["no", "normal", "all"] = Field(
+        default="normal",
+        description="Untracked files shown by git status (no, normal, all)",
+    )
 
     # Application Configuration
     log_level: str = Field(default="INFO", description="Logging level")
@@ -98,7 +110,6 @@ class GitAgentSettings(BaseSettings):
         default=None, 
         description="Tavily API key for search capabilities",
         alias="TAVILY_API_KEY"
-        env_file_encoding="utf-8"
     )
 
     def model_post_init(self, __context) -> None:
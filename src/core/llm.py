@@ -7,7 +7,7 @@ from typing import Optional, List
 from config.settings import settings
 from utils.logging import logger
 from utils.exceptions import OllamaConnectionError
-from tools.git import GIT_TOOLS
+from tools.git import GIT_TOOLS, clear_git_cache
 
 class OllamaManager:
     """Manages Ollama LLM interactions"""
@@ -116,6 +116,9 @@ Thought: {agent_scratchpad}
         try:
             logger.debug(f"Processing request: {user_input}")
             
+            # Cached git output is only trusted within a single turn
+            clear_git_cache()
+            
             # Check if we're in a git repository for git-related requests
             from config.settings import is_git_repo
             if not is_git_repo():
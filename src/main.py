@@ -14,6 +14,7 @@ from config.settings import settings
 from utils.logging import logger
 from utils.exceptions import OllamaConnectionError
 from core.llm import OllamaManager, GitPromptManager
+from tools.git import set_ollama_manager
 
 class GitAgentApp(App):
     """GitAgent TUI Application"""
@@ -72,6 +73,8 @@ class GitAgentApp(App):
         
         try:
             self.ollama_manager = OllamaManager()
+            # Commit message tools reuse this client instead of building their own
+            set_ollama_manager(self.ollama_manager)
             self.prompt_manager = GitPromptManager(self.ollama_manager)
             
             # Check health
@@ -1,9 +1,21 @@
+import functools
+import hashlib
+import json
 import subprocess
 import os
+import select
+import selectors
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple, Union
 from langchain_core.tools import tool
-from rich.console import Console
+try:
+    import pygit2
+except ImportError:  # optional: read-only tools fall back to the git CLI
+    pygit2 = None
 from rich.prompt import Confirm
 
 from config.settings import settings
@@ -11,56 +23,675 @@ from utils.exceptions import GitCommandError, UnsafeOperationError
 from utils.logging import logger
 from config.settings import get_git_root
 
-console = Console()
+if TYPE_CHECKING:
+    from core.llm import OllamaManager
 
-def run_git_command(command: List[str], cwd: Path = None) -> Dict[str, Any]:
-    """Execute a git command safely"""
+class GitResult:
+    """Outcome of a git command; stdout stays bytes until it is first read as text"""
+    
+    __slots__ = ("stdout_bytes", "stderr", "returncode", "command", "_stdout")
+    
+    def __init__(self, command: str, returncode: int, stdout_bytes: bytes = b"", stderr: str = ""):
+        self.command = command
+        self.returncode = returncode
+        self.stdout_bytes = stdout_bytes
+        self.stderr = stderr
+        self._stdout: Optional[str] = None
+    
+    @property
+    def success(self) -> bool:
+        return self.returncode == 0
+    
+    @property
+    def stdout(self) -> str:
+        if self._stdout is None:
+            self._stdout = self.stdout_bytes.decode("utf-8", "replace").strip()
+        return self._stdout
+
+# Frozen at import: O(1) membership checks on every call
+_ALLOWED = frozenset(settings.allowed_git_commands)
+
+# Commands whose output never reads the working tree, so the repo state below keys it fully
+_READ_ONLY_ACTIONS = frozenset({"log", "show"})
+# `git diff` only skips the working tree when comparing the index against HEAD
+_INDEX_ONLY_DIFF_ARGS = frozenset({"--cached", "--staged"})
+_CACHE_MAXSIZE = 64
+_result_cache: "OrderedDict[tuple, GitResult]" = OrderedDict()
+_cache_lock = threading.Lock()
+# Bumped by clear_git_cache() so entries from before a mutation never match
+_cache_generation = 0
+
+@functools.lru_cache(maxsize=32)
+def _find_git_dir(cwd: Path) -> Optional[Path]:
+    """Locate the .git directory for cwd without spawning git"""
+    for directory in (cwd, *cwd.parents):
+        dot_git = directory / ".git"
+        if dot_git.is_dir():
+            return dot_git
+        if dot_git.is_file():
+            # Worktrees and submodules: ".git" holds "gitdir: <path>"
+            content = dot_git.read_text(encoding="utf-8").strip()
+            if content.startswith("gitdir:"):
+                return (directory / content[len("gitdir:"):].strip()).resolve()
+    return None
+
+def _repo_state(git_dir: Path) -> Optional[tuple]:
+    """Cheap fingerprint of HEAD and the index, None if it cannot be read"""
+    try:
+        head = (git_dir / "HEAD").read_bytes()
+        ref = b""
+        if head.startswith(b"ref:"):
+            ref_path = git_dir / head[4:].strip().decode("utf-8")
+            if ref_path.is_file():
+                ref = ref_path.read_bytes()
+        index = git_dir / "index"
+        index_mtime = index.stat().st_mtime_ns if index.exists() else 0
+        return head, ref, index_mtime
+    except OSError:
+        return None
+
+def run_git_command(command: List[str], cwd: Path = None) -> GitResult:
+    """Execute a git command safely, caching read-only results"""
+    # Validate command is allowed
+    if command[0] != "git":
+        command = ["git"] + command
+    
+    git_action = command[1] if len(command) > 1 else ""
+    return _git(git_action)(*command[2:], cwd=cwd)
+
+def _run_cached(command: List[str], cwd: Path) -> GitResult:
+    """Run a read-only command through the result cache"""
+    cmd_str = " ".join(command)
+    git_dir = _find_git_dir(Path(cwd).resolve())
+    state = _repo_state(git_dir) if git_dir else None
+    if state is None:
+        return _run_git_command(command, cmd_str, cwd)
+    
+    # Read once: a clear_git_cache() during the run must not adopt this result
+    generation = _cache_generation
+    command_key = (tuple(command), str(cwd))
+    key = (*command_key, generation, *state)
+    with _cache_lock:
+        cached = _result_cache.get(key)
+        if cached is not None:
+            _result_cache.move_to_end(key)
+            logger.debug(f"Cache hit for git command: {cmd_str}")
+            return cached
+    
+    result = _run_git_command(command, cmd_str, cwd)
+    state = _repo_state(git_dir)
+    if state is None:
+        return result
+    key = (*command_key, generation, *state)
+    with _cache_lock:
+        if generation != _cache_generation:
+            return result
+        _result_cache[key] = result
+        if len(_result_cache) > _CACHE_MAXSIZE:
+            _result_cache.popitem(last=False)
+    return result
+
+_GIT_TIMEOUT = 30
+_READ_SIZE = 65536
+
+def _spawn_and_drain(command: List[str], cwd: Path, timeout: float = _GIT_TIMEOUT, input: bytes = None) -> Tuple[int, bytes, bytes]:
+    """Run command, feed it input and drain stdout/stderr until it exits or the deadline passes"""
+    deadline = time.monotonic() + timeout
+    proc = subprocess.Popen(
+        command,
+        cwd=cwd,
+        stdin=subprocess.PIPE if input is not None else None,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        bufsize=0,
+        close_fds=True,
+    )
+    out_fd, err_fd = proc.stdout.fileno(), proc.stderr.fileno()
+    chunks: Dict[int, List[bytes]] = {out_fd: [], err_fd: []}
+    try:
+        with selectors.DefaultSelector() as selector:
+            selector.register(out_fd, selectors.EVENT_READ)
+            selector.register(err_fd, selectors.EVENT_READ)
+            if input is not None:
+                pending = memoryview(input)
+                if pending:
+                    selector.register(proc.stdin.fileno(), selectors.EVENT_WRITE)
+                else:
+                    proc.stdin.close()
+            while selector.get_map():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise subprocess.TimeoutExpired(command, timeout)
+                for key, _ in selector.select(remaining):
+                    if key.fd not in chunks:
+                        try:
+                            pending = pending[os.write(key.fd, pending[:select.PIPE_BUF]):]
+                        except BrokenPipeError:
+                            pending = pending[:0]
+                        if not pending:
+                            selector.unregister(key.fd)
+                            proc.stdin.close()
+                        continue
+                    data = os.read(key.fd, _READ_SIZE)
+                    if data:
+                        chunks[key.fd].append(data)
+                    else:
+                        selector.unregister(key.fd)
+        returncode = proc.wait(timeout=max(deadline - time.monotonic(), 0))
+    except BaseException:
+        proc.kill()
+        proc.wait()
+        raise
+    finally:
+        for pipe in (proc.stdin, proc.stdout, proc.stderr):
+            if pipe is not None:
+                pipe.close()
+    return returncode, b"".join(chunks[out_fd]), b"".join(chunks[err_fd])
+
+def _run_git_command(command: List[str], cmd_str: str, cwd: Path, input: bytes = None) -> GitResult:
+    try:
+        logger.debug(f"Running git command: {cmd_str}")
+        returncode, stdout, stderr = _spawn_and_drain(command, cwd, input=input)
+        
+        # stdout is decoded lazily by GitResult, only if a caller needs the text
+        return GitResult(cmd_str, returncode, stdout, stderr.decode("utf-8", "replace").strip())
+    
+    except subprocess.TimeoutExpired:
+        raise GitCommandError(cmd_str, -1, "Command timed out")
+    except Exception as e:
+        raise GitCommandError(cmd_str, -1, str(e))
+
+def clear_git_cache() -> None:
+    """Drop cached read-only git output (call on new turns and after mutations)"""
+    global _cache_generation
+    with _cache_lock:
+        _cache_generation += 1
+        _result_cache.clear()
+
+def _make_runner(action: str) -> Callable[..., GitResult]:
+    """Build the runner for one allowed subcommand, with its prefix and cache policy fixed"""
+    prefix = ("git", action)
+    
+    if action in _READ_ONLY_ACTIONS:
+        def run(*args: str, cwd: Path = None) -> GitResult:
+            return _run_cached([*prefix, *args], cwd or Path.cwd())
+    elif action == "diff":
+        def run(*args: str, cwd: Path = None) -> GitResult:
+            command = [*prefix, *args]
+            if _INDEX_ONLY_DIFF_ARGS.intersection(args):
+                return _run_cached(command, cwd or Path.cwd())
+            return _run_git_command(command, " ".join(command), cwd or Path.cwd())
+    else:
+        def run(*args: str, cwd: Path = None, input: bytes = None) -> GitResult:
+            command = [*prefix, *args]
+            return _run_git_command(command, " ".join(command), cwd or Path.cwd(), input)
+    
+    run.__name__ = run.__qualname__ = f"_run_git_{action}"
+    return run
+
+# One runner per allowed subcommand; validation happens once, here
+_GIT_RUNNERS: Dict[str, Callable[..., GitResult]] = {
+    action: _make_runner(action) for action in _ALLOWED
+}
+
+def _git(action: str) -> Callable[..., GitResult]:
+    """Return the runner for an allowed git subcommand"""
+    runner = _GIT_RUNNERS.get(action)
+    if runner is None:
+        raise UnsafeOperationError(f"Git command '{action}' not allowed")
+    return runner
+
+# Record separator between the sections of run_git_bulk's output
+_BULK_SEP = b"\x1e"
+# Commands run_git_bulk can fuse, by section name
+_BULK_SECTIONS = {
+    "status": f"git status --porcelain -b --untracked-files={settings.status_untracked_files}",
+    "diff": "git diff --cached",
+    "log": "git log -n10 --oneline",
+}
+
+def run_git_bulk(sections: Sequence[str] = tuple(_BULK_SECTIONS), cwd: Path = None) -> Dict[str, GitResult]:
+    """Run several of status, staged diff and log in a single git invocation"""
+    if not cwd:
+        cwd = Path.cwd()
+    
+    commands = [(name, _BULK_SECTIONS[name]) for name in sections]
+    for _, cmd in commands:
+        if cmd.split()[1] not in _ALLOWED:
+            raise UnsafeOperationError(f"Git command '{cmd.split()[1]}' not allowed")
+    
+    # Each section is followed by "\x1e<exit code>\x1e" so failures stay per-section
+    alias = "!f() { " + " ".join(
+        f"{cmd}; printf '\\036%d\\036' $?;" for _, cmd in commands
+    ) + " }; f"
+    command = ["git", "-c", f"alias.bulk={alias}", "bulk"]
+    try:
+        logger.debug("Running git bulk: " + "; ".join(cmd for _, cmd in commands))
+        _, stdout, stderr = _spawn_and_drain(command, cwd)
+    except subprocess.TimeoutExpired:
+        raise GitCommandError("git bulk", -1, "Command timed out")
+    except Exception as e:
+        raise GitCommandError("git bulk", -1, str(e))
+    
+    stderr = stderr.decode("utf-8", "replace").strip()
+    # [out, code, out, code, ..., ""]
+    parts = stdout.split(_BULK_SEP)
+    if len(parts) != 2 * len(commands) + 1:
+        # Not in a repository (alias never ran) or output contained the separator
+        return {name: run_git_command(cmd.split(), cwd) for name, cmd in commands}
+    
+    results = {}
+    for i, (name, cmd) in enumerate(commands):
+        returncode = int(parts[2 * i + 1])
+        results[name] = GitResult(cmd, returncode, parts[2 * i], stderr if returncode else "")
+    return results
+
+def run_git_command_stream(command: List[str], cwd: Path = None) -> Iterator[bytes]:
+    """Execute a read-only git command and yield its stdout in chunks"""
     if not cwd:
         cwd = Path.cwd()
     
-    # Validate command is allowed
     if command[0] != "git":
         command = ["git"] + command
     
     git_action = command[1] if len(command) > 1 else ""
-    if git_action not in settings.allowed_git_commands:
+    if git_action not in _ALLOWED:
         raise UnsafeOperationError(f"Git command '{git_action}' not allowed")
     
+    cmd_str = " ".join(command)
+    logger.debug(f"Streaming git command: {cmd_str}")
+    deadline = time.monotonic() + _GIT_TIMEOUT
     try:
-        logger.debug(f"Running git command: {' '.join(command)}")
-        result = subprocess.run(
+        proc = subprocess.Popen(
             command,
             cwd=cwd,
-            capture_output=True,
-            text=True,
-            timeout=30
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            bufsize=0,
         )
-        
-        return {
-            "success": result.returncode == 0,
-            "stdout": result.stdout.strip(),
-            "stderr": result.stderr.strip(),
-            "returncode": result.returncode,
-            "command": " ".join(command)
-        }
+    except Exception as e:
+        raise GitCommandError(cmd_str, -1, str(e))
     
+    out_fd, err_fd = proc.stdout.fileno(), proc.stderr.fileno()
+    stderr_chunks: List[bytes] = []
+    try:
+        # Same deadline as run_git_command, enforced by select() instead of a blocking read
+        with selectors.DefaultSelector() as selector:
+            selector.register(out_fd, selectors.EVENT_READ)
+            selector.register(err_fd, selectors.EVENT_READ)
+            # Keep going after stdout closes until stderr does too, still under the deadline
+            while selector.get_map():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise subprocess.TimeoutExpired(command, _GIT_TIMEOUT)
+                for key, _ in selector.select(remaining):
+                    data = os.read(key.fd, _READ_SIZE)
+                    if not data:
+                        selector.unregister(key.fd)
+                    elif key.fd == out_fd:
+                        yield data
+                    else:
+                        stderr_chunks.append(data)
+        returncode = proc.wait(timeout=max(deadline - time.monotonic(), 0))
+        if returncode != 0:
+            stderr = b"".join(stderr_chunks).decode("utf-8", "replace").strip()
+            raise GitCommandError(cmd_str, returncode, stderr)
     except subprocess.TimeoutExpired:
-        raise GitCommandError(" ".join(command), -1, "Command timed out")
-    except Exception as e:
-        raise GitCommandError(" ".join(command), -1, str(e))
+        raise GitCommandError(cmd_str, -1, "Command timed out")
+    finally:
+        # Consumer stopped early or an error occurred: don't leave the child behind
+        if proc.poll() is None:
+            proc.kill()
+            proc.wait()
+        proc.stdout.close()
+        proc.stderr.close()
+
+def _buffer_prefix(chunks: Iterator[bytes], limit: int) -> Tuple[bytes, Optional[Iterator[bytes]]]:
+    """Read up to limit bytes; return them and the remaining stream (None if exhausted)"""
+    buffered = bytearray()
+    for chunk in chunks:
+        buffered += chunk
+        if len(buffered) >= limit:
+            return bytes(buffered), chunks
+    return bytes(buffered), None
+
+def _staged_files() -> List[Dict[str, Any]]:
+    """Per-file status and line counts of the staged changes, from --raw and --numstat"""
+    numstat = _git("diff")("--cached", "--numstat", "-z")
+    if not numstat.success:
+        raise GitCommandError(numstat.command, numstat.returncode, numstat.stderr)
+    raw = _git("diff")("--cached", "--raw", "-z")
+    
+    # -z: paths arrive verbatim and NUL-terminated instead of C-quoted
+    raw_fields = iter(raw.stdout_bytes.decode("utf-8", "replace").split("\0"))
+    numstat_fields = iter(numstat.stdout_bytes.decode("utf-8", "replace").split("\0"))
+    
+    # --raw and --numstat list the same diff queue in the same order
+    files = []
+    for meta in raw_fields:
+        if not meta:
+            break
+        status = meta.split()[-1]
+        paths = [next(raw_fields)]
+        if status[0] in "RC":
+            # Renames and copies carry the source path, then the destination
+            paths.append(next(raw_fields))
+        added, deleted, numstat_path = next(numstat_fields).split("\t", 2)
+        if not numstat_path:
+            # Same rename/copy layout: an empty path field, then both paths
+            next(numstat_fields)
+            next(numstat_fields)
+        entry = {
+            "path": paths[-1],
+            "status": status,
+            # Binary files report "-" for both counts
+            "added": int(added) if added.isdigit() else None,
+            "deleted": int(deleted) if deleted.isdigit() else None,
+        }
+        if len(paths) == 2:
+            entry["from"] = paths[0]
+        files.append(entry)
+    return files
+
+def _staged_changes(files: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Structured summary of the staged changes for LLM prompts"""
+    stat = _git("diff")("--cached", "--stat")
+    stat_lines = stat.stdout.splitlines()
+    return {
+        "files": files,
+        "summary": stat_lines[-1].strip() if stat_lines else "",
+        "excerpt": _staged_excerpt(settings.max_diff_bytes) if files else "",
+    }
+
+# Largest added + deleted line count still eligible for a templated commit message
+_TRIVIAL_LINES = 3
+
+def _trivial_commit_msg(files: List[Dict[str, Any]]) -> Optional[str]:
+    """Rule-based message for a single small change, None when the LLM is needed"""
+    if len(files) != 1:
+        return None
+    change = files[0]
+    if change["added"] is None or change["deleted"] is None:
+        return None
+    lines_changed = change["added"] + change["deleted"]
+    if lines_changed > _TRIVIAL_LINES:
+        return None
+    
+    path, status = change["path"], change["status"]
+    if status.startswith("R") and lines_changed == 0:
+        return f"chore: rename {change['from']} → {path}"
+    if status != "M":
+        return None
+    if path.endswith(".md"):
+        return f"docs: update {path}"
+    if path.endswith(".py") and change["added"] <= 1 and change["deleted"] <= 1:
+        return f"fix: tweak {path}"
+    return None
+
+def _staged_excerpt(limit: int) -> str:
+    """First limit bytes of the staged diff; the rest is never read from git"""
+    stream = run_git_command_stream(["git", "diff", "--cached", "--unified=1"])
+    try:
+        excerpt, remaining = _buffer_prefix(stream, limit)
+    finally:
+        stream.close()
+    return _clip_diff(excerpt, limit, truncated=remaining is not None)
+
+def _clip_diff(diff: bytes, limit: int, truncated: bool = False) -> str:
+    """Decode at most limit bytes of a diff, marking it when anything was cut"""
+    text = diff[:limit].decode("utf-8", "ignore")
+    if truncated or len(diff) > limit:
+        text += "\n... [diff truncated]"
+    return text
+
+# In-process (libgit2) implementations of the read-only tools, used when pygit2 is installed
+_libgit2_lock = threading.Lock()
+
+@functools.lru_cache(maxsize=8)
+def _open_repository(cwd: Path) -> Optional["pygit2.Repository"]:
+    path = pygit2.discover_repository(str(cwd))
+    if path is None:
+        return None
+    repo = pygit2.Repository(path)
+    return None if repo.is_bare else repo
+
+def _libgit2_repo(cwd: Path = None) -> Optional["pygit2.Repository"]:
+    """Module-cached pygit2 repository for cwd, None when pygit2 is unavailable"""
+    if pygit2 is None:
+        return None
+    try:
+        return _open_repository(Path(cwd or Path.cwd()).resolve())
+    except pygit2.GitError as e:
+        logger.debug(f"pygit2 could not open repository: {e}")
+        return None
+
+def _libgit2_result(command: str, stdout: str) -> GitResult:
+    """Wrap in-process output in the same GitResult as the CLI path"""
+    return GitResult(command, 0, stdout.encode("utf-8"))
+
+if pygit2 is not None:
+    _INDEX_CODES = (
+        (pygit2.GIT_STATUS_INDEX_NEW, "A"),
+        (pygit2.GIT_STATUS_INDEX_MODIFIED, "M"),
+        (pygit2.GIT_STATUS_INDEX_DELETED, "D"),
+        (pygit2.GIT_STATUS_INDEX_RENAMED, "R"),
+        (pygit2.GIT_STATUS_INDEX_TYPECHANGE, "T"),
+    )
+    _WORKTREE_CODES = (
+        (pygit2.GIT_STATUS_WT_MODIFIED, "M"),
+        (pygit2.GIT_STATUS_WT_DELETED, "D"),
+        (pygit2.GIT_STATUS_WT_RENAMED, "R"),
+        (pygit2.GIT_STATUS_WT_TYPECHANGE, "T"),
+    )
+
+def _porcelain_code(flags: int) -> str:
+    """Two-letter `git status --porcelain` code for libgit2 status flags"""
+    if flags & pygit2.GIT_STATUS_CONFLICTED:
+        return "UU"
+    if flags & pygit2.GIT_STATUS_WT_NEW:
+        return "??"
+    index = next((code for flag, code in _INDEX_CODES if flags & flag), " ")
+    worktree = next((code for flag, code in _WORKTREE_CODES if flags & flag), " ")
+    return index + worktree
+
+def _libgit2_branch_line(repo: "pygit2.Repository") -> str:
+    """`## branch...upstream [ahead N, behind M]` header of `git status -b`"""
+    if repo.head_is_unborn:
+        # Branch names may contain "/", so only the refs/heads/ prefix is dropped
+        return f"## No commits yet on {repo.references['HEAD'].target.removeprefix('refs/heads/')}"
+    if repo.head_is_detached:
+        return "## HEAD (no branch)"
+    
+    name = repo.head.shorthand
+    branch = repo.branches.local.get(name)
+    upstream = branch.upstream if branch is not None else None
+    if upstream is None:
+        try:
+            # Upstream configured but its remote-tracking ref was deleted
+            gone = branch.upstream_name.removeprefix("refs/remotes/")
+        except (AttributeError, KeyError):
+            return f"## {name}"
+        return f"## {name}...{gone} [gone]"
+    
+    ahead, behind = repo.ahead_behind(repo.head.target, upstream.target)
+    counts = ", ".join(
+        f"{label} {count}" for label, count in (("ahead", ahead), ("behind", behind)) if count
+    )
+    line = f"## {name}...{upstream.shorthand}"
+    return f"{line} [{counts}]" if counts else line
+
+def _libgit2_status(repo: "pygit2.Repository") -> GitResult:
+    start = time.perf_counter()
+    lines = [_libgit2_branch_line(repo)]
+    statuses = repo.status(untracked_files=settings.status_untracked_files)
+    entries = [
+        (_porcelain_code(flags), path)
+        for path, flags in statuses.items()
+        if not flags & pygit2.GIT_STATUS_IGNORED
+    ]
+    # Like git: tracked changes first, then untracked files, each sorted by path
+    entries.sort(key=lambda entry: (entry[0] == "??", entry[1]))
+    lines.extend(f"{code} {path}" for code, path in entries)
+    # pygit2 does not expose git_status_list_get_perfdata; log the equivalent totals
+    logger.debug(
+        f"pygit2 status: {len(statuses)} entries, {len(repo.index)} index entries "
+        f"in {(time.perf_counter() - start) * 1000:.1f} ms"
+    )
+    return _libgit2_result("pygit2 status", "\n".join(lines))
+
+def _libgit2_log(repo: "pygit2.Repository", num_commits: int) -> GitResult:
+    lines = []
+    if not repo.head_is_unborn:
+        for commit in repo.walk(repo.head.target, pygit2.GIT_SORT_TOPOLOGICAL | pygit2.GIT_SORT_TIME):
+            if len(lines) >= num_commits:
+                break
+            subject = commit.message.strip().split("\n\n", 1)[0].replace("\n", " ")
+            lines.append(f"{commit.short_id} {subject}")
+    return _libgit2_result("pygit2 log", "\n".join(lines))
+
+def _libgit2_diff(repo: "pygit2.Repository", cached: bool) -> Optional[GitResult]:
+    if cached and repo.head_is_unborn:
+        # No HEAD tree to compare against; let the CLI handle the initial commit
+        return None
+    # Pick up index changes made by other processes since the last call
+    repo.index.read(False)
+    diff = repo.diff("HEAD", cached=True) if cached else repo.diff()
+    # Match git's default rename detection
+    diff.find_similar()
+    return _libgit2_result(f"pygit2 diff{' --cached' if cached else ''}", diff.patch or "")
+
+def _read_with_libgit2(func: Callable[..., Optional[GitResult]], *args: Any) -> Optional[GitResult]:
+    """Run a libgit2 reader; None means use the git CLI instead"""
+    repo = _libgit2_repo()
+    if repo is None:
+        return None
+    try:
+        with _libgit2_lock:
+            return func(repo, *args)
+    except (pygit2.GitError, KeyError, ValueError) as e:
+        logger.debug(f"pygit2 {func.__name__} failed, falling back to git CLI: {e}")
+        return None
+
+def _atomic_write_editmsg(path: Path, message: str) -> None:
+    """Replace COMMIT_EDITMSG atomically via a temp file and os.replace"""
+    tmp_path = f"{path}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        data = memoryview(message.encode("utf-8"))
+        while data:
+            data = data[os.write(fd, data):]
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+    os.replace(tmp_path, path)
+
+# Shared LLM client for the commit message tools: the app's, or one created on first use
+_OLLAMA: Optional["OllamaManager"] = None
+_ollama_lock = threading.Lock()
+
+def _ollama() -> "OllamaManager":
+    """Return the shared OllamaManager so its HTTP connection pool is reused across calls"""
+    global _OLLAMA
+    if _OLLAMA is None:
+        with _ollama_lock:
+            if _OLLAMA is None:
+                # Imported lazily: core.llm imports this module for GIT_TOOLS
+                from core.llm import OllamaManager
+                _OLLAMA = OllamaManager()
+    return _OLLAMA
+
+def set_ollama_manager(manager: "OllamaManager") -> None:
+    """Share the application's OllamaManager with the commit message tools"""
+    global _OLLAMA
+    with _ollama_lock:
+        _OLLAMA = manager
+
+# Commit message prompts, filled with str.format from the stored inputs
+_PROMPT_TEMPLATES = {
+    "generate": """
+Based on the following summary of staged changes, generate a concise and informative commit message.
+
+Follow these guidelines:
+- Start with a verb in imperative mood (Add, Fix, Update, Remove, etc.)
+- Keep the first line under 50 characters
+- Be specific about what was changed
+- Use conventional commit format if applicable
+
+Staged changes (JSON with per-file line counts, a summary and a diff excerpt):
+{staged}
+
+Current status:
+{status}
+
+Generate only the commit message, no quotes or extra text:""",
+    "improve": """
+Improve the following commit message based on the actual staged changes.
+
+Current commit message:
+{existing_message}
+
+Staged changes (JSON with per-file line counts, a summary and a diff excerpt):
+{staged}
+
+Please provide an improved commit message that:
+- Accurately reflects the changes
+- Follows conventional commit format
+- Is concise but informative
+- Uses imperative mood
+
+Generate only the improved commit message:""",
+    "diff": """
+Based on this git diff, generate a concise commit message:
+
+{diff}
+
+Follow conventional commit guidelines:
+- Use imperative mood (Add, Fix, Update, etc.)
+- Keep first line under 50 characters
+- Be specific and clear
+
+Generate only the commit message:""",
+}
+
+_CACHED_MESSAGES = 32
+# Prompt inputs by digest, so the lru_cache key stays a short hash
+_prompt_inputs: Dict[str, Dict[str, str]] = {}
+
+@functools.lru_cache(maxsize=_CACHED_MESSAGES)
+def _cached_commit_msg(inputs_sha: str, style: str) -> str:
+    return _ollama().llm.invoke(_PROMPT_TEMPLATES[style].format(**_prompt_inputs[inputs_sha]))
+
+def _generate_commit_msg(style: str, **inputs: str) -> str:
+    """Generate a commit message, reusing the last result for identical inputs"""
+    payload = json.dumps([style, inputs], sort_keys=True).encode("utf-8")
+    inputs_sha = hashlib.blake2b(payload, digest_size=16).hexdigest()
+    _prompt_inputs[inputs_sha] = inputs
+    while len(_prompt_inputs) > _CACHED_MESSAGES:
+        del _prompt_inputs[next(iter(_prompt_inputs))]
+    return _cached_commit_msg(inputs_sha, style)
+
+def _clear_commit_msg_cache() -> None:
+    _cached_commit_msg.cache_clear()
+    _prompt_inputs.clear()
+
+def _status_report(result: GitResult) -> str:
+    """Tool output for a `git status --porcelain -b` result"""
+    if result.success:
+        if result.stdout_bytes.strip():
+            return f"Git status:\n{result.stdout}"
+        else:
+            return "Working directory is clean"
+    else:
+        return f"Error getting git status: {result.stderr}"
 
 @tool
 def get_git_status() -> str:
     """Get the current Git repository status"""
     try:
-        result = run_git_command(["git", "status", "--porcelain", "-b"])
-        if result["success"]:
-            if result["stdout"]:
-                return f"Git status:\n{result['stdout']}"
-            else:
-                return "Working directory is clean"
-        else:
-            return f"Error getting git status: {result['stderr']}"
+        return _status_report(
+            _read_with_libgit2(_libgit2_status)
+            or _git("status")("--porcelain", "-b", f"--untracked-files={settings.status_untracked_files}")
+        )
     except Exception as e:
         return f"Error: {str(e)}"
 
@@ -68,9 +699,6 @@ def get_git_status() -> str:
 def generate_commit_message() -> str:
     """Generate an AI-powered commit message based on staged changes"""
     try:
-        from pathlib import Path
-        import os
-        
         # Get the git repository root
         git_root = get_git_root()
         if not git_root:
@@ -79,45 +707,29 @@ def generate_commit_message() -> str:
         commit_editmsg_path = git_root / ".git" / "COMMIT_EDITMSG"
         
         # Get staged changes (what will be committed)
-        result = run_git_command(["git", "diff", "--cached"])
-        
-        if not result["success"]:
-            return f"Error getting staged changes: {result['stderr']}"
+        try:
+            files = _staged_files()
+        except GitCommandError as e:
+            return f"Error getting staged changes: {e.stderr}"
         
-        if not result["stdout"]:
+        if not files:
             return "No staged changes found. Please stage your changes first with 'git add'."
         
-        # Get current status for context
-        status_result = run_git_command(["git", "status", "--porcelain"])
-        
-        # Generate commit message using LLM
-        from core.llm import OllamaManager
-        
+        # Generate commit message from a template, or using LLM
         try:
-            ollama = OllamaManager()
-            
-            prompt = f"""
-Based on the following git diff of staged changes, generate a concise and informative commit message.
-
-Follow these guidelines:
-- Start with a verb in imperative mood (Add, Fix, Update, Remove, etc.)
-- Keep the first line under 50 characters
-- Be specific about what was changed
-- Use conventional commit format if applicable
-
-Staged changes:
-{result['stdout']}
-
-Current status:
-{status_result.get('stdout', '')}
-
-Generate only the commit message, no quotes or extra text:"""
-
-            generated_message = ollama.llm.invoke(prompt)
+            generated_message = _trivial_commit_msg(files) if settings.llm_skip_trivial else None
+            if generated_message is None:
+                # Summary, excerpt and status are only worth fetching for the LLM
+                staged = _staged_changes(files)
+                status_result = _git("status")("--porcelain")
+                generated_message = _generate_commit_msg(
+                    "generate",
+                    staged=json.dumps(staged, indent=2),
+                    status=status_result.stdout,
+                )
             
             # Write to COMMIT_EDITMSG file
-            with open(commit_editmsg_path, 'w', encoding='utf-8') as f:
-                f.write(generated_message.strip())
+            _atomic_write_editmsg(commit_editmsg_path, generated_message.strip())
             
             return f"Generated commit message and saved to .git/COMMIT_EDITMSG:\n\n{generated_message.strip()}"
             
@@ -131,8 +743,6 @@ Generate only the commit message, no quotes or extra text:"""
 def read_commit_editmsg() -> str:
     """Read the current content of .git/COMMIT_EDITMSG file"""
     try:
-        from pathlib import Path
-        
         git_root = get_git_root()
         if not git_root:
             return "Error: Not in a git repository"
@@ -157,8 +767,6 @@ def read_commit_editmsg() -> str:
 def improve_commit_message() -> str:
     """Read existing COMMIT_EDITMSG and improve it with AI suggestions"""
     try:
-        from pathlib import Path
-        
         git_root = get_git_root()
         if not git_root:
             return "Error: Not in a git repository"
@@ -173,39 +781,25 @@ def improve_commit_message() -> str:
             existing_message = ""
         
         # Get staged changes for context
-        diff_result = run_git_command(["git", "diff", "--cached"])
+        try:
+            files = _staged_files()
+        except GitCommandError:
+            files = []
         
-        if not diff_result["success"] or not diff_result["stdout"]:
+        if not files:
             return "No staged changes found to analyze."
+        staged = _staged_changes(files)
         
         # Generate improved commit message
-        from core.llm import OllamaManager
-        
         try:
-            ollama = OllamaManager()
-            
-            prompt = f"""
-Improve the following commit message based on the actual staged changes.
-
-Current commit message:
-{existing_message or "(empty)"}
-
-Staged changes:
-{diff_result['stdout']}
-
-Please provide an improved commit message that:
-- Accurately reflects the changes
-- Follows conventional commit format
-- Is concise but informative
-- Uses imperative mood
-
-Generate only the improved commit message:"""
-
-            improved_message = ollama.llm.invoke(prompt)
+            improved_message = _generate_commit_msg(
+                "improve",
+                existing_message=existing_message or "(empty)",
+                staged=json.dumps(staged, indent=2),
+            )
             
             # Write improved message back to file
-            with open(commit_editmsg_path, 'w', encoding='utf-8') as f:
-                f.write(improved_message.strip())
+            _atomic_write_editmsg(commit_editmsg_path, improved_message.strip())
             
             return f"Improved commit message:\n\n{improved_message.strip()}\n\nSaved to .git/COMMIT_EDITMSG"
             
@@ -219,28 +813,31 @@ Generate only the improved commit message:"""
 def get_git_diff(file_path: str = "", generate_commit: bool = False) -> str:
     """Get git diff and optionally generate commit message"""
     try:
-        from pathlib import Path
-        
         # Determine which diff to show
         if file_path == "--cached" or file_path == "--staged":
-            cmd = ["git", "diff", "--cached"]
+            args = ["--cached"]
             diff_type = "staged changes"
         elif file_path:
-            cmd = ["git", "diff", file_path]
+            args = [file_path]
             diff_type = f"changes in {file_path}"
         else:
-            cmd = ["git", "diff"]
+            args = []
             diff_type = "working directory changes"
         
-        result = run_git_command(cmd)
+        if args == ["--cached"]:
+            result = _read_with_libgit2(_libgit2_diff, True) or _git("diff")("--cached")
+        elif not args:
+            result = _read_with_libgit2(_libgit2_diff, False) or _git("diff")()
+        else:
+            result = _git("diff")(*args)
         
-        if not result["success"]:
-            return f"Error getting git diff: {result['stderr']}"
+        if not result.success:
+            return f"Error getting git diff: {result.stderr}"
         
-        if not result["stdout"]:
+        if not result.stdout_bytes.strip():
             return f"No {diff_type} found"
         
-        diff_output = f"Git diff ({diff_type}):\n{result['stdout']}"
+        diff_output = f"Git diff ({diff_type}):\n{result.stdout}"
         
         # If requested, generate commit message from the diff
         if generate_commit:
@@ -249,27 +846,13 @@ def get_git_diff(file_path: str = "", generate_commit: bool = False) -> str:
                 if git_root:
                     commit_editmsg_path = git_root / ".git" / "COMMIT_EDITMSG"
                     
-                    # Generate commit message using the diff
-                    from core.llm import OllamaManager
-                    ollama = OllamaManager()
-                    
-                    prompt = f"""
-Based on this git diff, generate a concise commit message:
-
-{result['stdout']}
-
-Follow conventional commit guidelines:
-- Use imperative mood (Add, Fix, Update, etc.)
-- Keep first line under 50 characters
-- Be specific and clear
-
-Generate only the commit message:"""
-
-                    commit_message = ollama.llm.invoke(prompt)
+                    # Generate commit message using the diff, bounded like the staged excerpt
+                    commit_message = _generate_commit_msg(
+                        "diff", diff=_clip_diff(result.stdout_bytes, settings.max_diff_bytes)
+                    )
                     
                     # Write to COMMIT_EDITMSG
-                    with open(commit_editmsg_path, 'w', encoding='utf-8') as f:
-                        f.write(commit_message.strip())
+                    _atomic_write_editmsg(commit_editmsg_path, commit_message.strip())
                     
                     diff_output += f"\n\n📝 Generated commit message (saved to .git/COMMIT_EDITMSG):\n{commit_message.strip()}"
                     
@@ -281,20 +864,53 @@ Generate only the commit message:"""
     except Exception as e:
         return f"Error: {str(e)}"
 
+def _parse_paths(files: Union[str, List[str]]) -> List[str]:
+    """Split the agent's Action Input into paths: a JSON list, or one path per line"""
+    if not isinstance(files, str):
+        return [str(path) for path in files]
+    
+    if files.lstrip().startswith("["):
+        try:
+            parsed = json.loads(files)
+        except json.JSONDecodeError:
+            parsed = None
+        if isinstance(parsed, list):
+            return [str(path) for path in parsed if str(path)]
+    if "\n" in files:
+        return [path for path in files.splitlines() if path]
+    # Anything else is one path, commas and surrounding spaces included
+    return [files] if files else []
+
 @tool
-def git_add_files(files: str) -> str:
-    """Add files to Git staging area. Use '.' for all files"""
+def git_add_files(files: Union[str, List[str]]) -> str:
+    """Add files to Git staging area. Stage several at once with a JSON list (["a.py", "b.py"]) or one path per line. Use '.' for all files"""
     try:
+        paths = _parse_paths(files)
+        if not paths:
+            return "Error: No files given to add"
+        
         # Confirm if adding all files
-        if files == "." and settings.require_confirmation:
+        if "." in paths and settings.require_confirmation:
             if not Confirm.ask("Add all files to staging area?"):
                 return "Operation cancelled by user"
         
-        result = run_git_command(["git", "add", files])
-        if result["success"]:
-            return f"Successfully added {files} to staging area"
+        if len(paths) == 1:
+            result = _git("add")(paths[0])
         else:
-            return f"Error adding files: {result['stderr']}"
+            # One `git add` for every path, read NUL-separated from stdin
+            result = _git("add")(
+                "--pathspec-from-file=-",
+                "--pathspec-file-nul",
+                input=b"\0".join(path.encode("utf-8") for path in paths),
+            )
+        
+        # A count, not the list: thousands of paths would flood the agent's context
+        added = paths[0] if len(paths) == 1 else f"{len(paths)} paths"
+        if result.success:
+            clear_git_cache()
+            return f"Successfully added {added} to staging area"
+        else:
+            return f"Error adding files: {result.stderr}"
     except Exception as e:
         return f"Error: {str(e)}"
 
@@ -305,11 +921,13 @@ def git_commit(message: str) -> str:
         if not message.strip():
             return "Error: Commit message cannot be empty"
         
-        result = run_git_command(["git", "commit", "-m", message])
-        if result["success"]:
+        result = _git("commit")("-m", message)
+        if result.success:
+            clear_git_cache()
+            _clear_commit_msg_cache()
             return f"Successfully committed with message: '{message}'"
         else:
-            return f"Error committing: {result['stderr']}"
+            return f"Error committing: {result.stderr}"
     except Exception as e:
         return f"Error: {str(e)}"
 
@@ -317,19 +935,20 @@ def git_commit(message: str) -> str:
 def git_push(remote: str = "origin", branch: str = "") -> str:
     """Push changes to remote repository"""
     try:
-        cmd = ["git", "push", remote]
+        args = [remote]
         if branch:
-            cmd.append(branch)
+            args.append(branch)
         
         if settings.require_confirmation:
             if not Confirm.ask(f"Push to {remote}{f'/{branch}' if branch else ''}?"):
                 return "Push cancelled by user"
         
-        result = run_git_command(cmd)
-        if result["success"]:
+        result = _git("push")(*args)
+        if result.success:
+            clear_git_cache()
             return f"Successfully pushed to {remote}"
         else:
-            return f"Error pushing: {result['stderr']}"
+            return f"Error pushing: {result.stderr}"
     except Exception as e:
         return f"Error: {str(e)}"
 
@@ -338,30 +957,70 @@ def git_pull(remote: str = "origin", branch: str = "") -> str:
     """Pull changes from remote repository"""
     try:
                
-        cmd = ["git", "pull", remote]
+        args = [remote]
         if branch:
-            cmd.append(branch)
+            args.append(branch)
         
-        result = run_git_command(cmd)
-        if result["success"]:
-            return f"Successfully pulled from {remote}: {result['stdout']}"
+        result = _git("pull")(*args)
+        if result.success:
+            clear_git_cache()
+            return f"Successfully pulled from {remote}: {result.stdout}"
         else:
-            return f"Error pulling: {result['stderr']}"
+            return f"Error pulling: {result.stderr}"
     except Exception as e:
         return f"Error: {str(e)}"
 
+# `git log` on a branch with no commits yet fails with this message
+_UNBORN_BRANCH = "does not have any commits yet"
+
+def _log_report(result: GitResult) -> str:
+    """Tool output for a `git log --oneline` result"""
+    if result.success:
+        if result.stdout_bytes.strip():
+            return f"Recent commits:\n{result.stdout}"
+        else:
+            return "No commits found"
+    elif _UNBORN_BRANCH in result.stderr:
+        return "No commits found"
+    else:
+        return f"Error getting git log: {result.stderr}"
+
 @tool
 def git_log(num_commits: int = 10) -> str:
     """Get git commit history"""
     try:
-        result = run_git_command(["git", "log", f"-{num_commits}", "--oneline"])
-        if result["success"]:
-            if result["stdout"]:
-                return f"Recent commits:\n{result['stdout']}"
-            else:
-                return "No commits found"
-        else:
-            return f"Error getting git log: {result['stderr']}"
+        return _log_report(
+            _read_with_libgit2(_libgit2_log, num_commits)
+            or _git("log")(f"-{num_commits}", "--oneline")
+        )
+    except Exception as e:
+        return f"Error: {str(e)}"
+
+# Workers for independent read-only tools (3/4 of the CPUs, at least 2)
+_pool = ThreadPoolExecutor(
+    max_workers=max(2, (os.cpu_count() or 4) * 3 // 4),
+    thread_name_prefix="gitagent-git",
+)
+
+def _status_and_log() -> str:
+    """git_snapshot's status and recent commits, in-process or from one fused git run"""
+    status = _read_with_libgit2(_libgit2_status)
+    log = _read_with_libgit2(_libgit2_log, 10)
+    if status is None or log is None:
+        sections = run_git_bulk(("status", "log"))
+        status, log = sections["status"], sections["log"]
+    return f"{_status_report(status)}\n\n{_log_report(log)}"
+
+@tool
+def git_snapshot() -> str:
+    """Get status, recent commits, working directory diff and COMMIT_EDITMSG in one call"""
+    try:
+        futures = [
+            _pool.submit(_status_and_log),
+            _pool.submit(get_git_diff.func),
+            _pool.submit(read_commit_editmsg.func),
+        ]
+        return "\n\n".join(future.result() for future in futures)
     except Exception as e:
         return f"Error: {str(e)}"
 
@@ -377,6 +1036,7 @@ GIT_TOOLS = [
     git_push,
     git_pull,
     git_log,
+    git_snapshot,
 ]
 
 
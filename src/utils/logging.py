@@ -1,13 +1,48 @@
+import atexit
+import copy
 import logging
+import queue
+import subprocess
 import sys
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
+from typing import Optional
+import langchain_core
 from rich.console import Console
 from rich.logging import RichHandler
 from rich.traceback import install
 from config.settings import settings
 
+# Capturing locals repr()s every frame variable (including whole diffs), so
+# only pay for it when debugging
+DEBUG = settings.log_level.upper() == "DEBUG"
+
 # Install rich traceback handler
-install(show_locals=True)
+install(show_locals=DEBUG, suppress=[subprocess, langchain_core])
+
+
+class _LocalQueueHandler(QueueHandler):
+    """QueueHandler for an in-process listener: keeps exc_info for rich tracebacks"""
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+
+# Listener thread draining the queue into the Rich and file handlers
+_listener: Optional[QueueListener] = None
+
+
+def _stop_listener() -> None:
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(_stop_listener)
 
 
 def setup_logging() -> logging.Logger:
@@ -30,7 +65,7 @@ def setup_logging() -> logging.Logger:
         console=console,
         show_path=False,
         rich_tracebacks=True,
-        tracebacks_show_locals=True,
+        tracebacks_show_locals=DEBUG,
     )
     rich_handler.setLevel(logging.INFO)
 
@@ -48,8 +83,16 @@ def setup_logging() -> logging.Logger:
     rich_handler.setFormatter(rich_formatter)
     file_handler.setFormatter(file_formatter)
 
-    logger.addHandler(rich_handler)
-    logger.addHandler(file_handler)
+    # Handlers run on the listener thread so callers never block on terminal/disk I/O
+    global _listener
+    _stop_listener()
+    log_queue = queue.SimpleQueue()
+    _listener = QueueListener(
+        log_queue, rich_handler, file_handler, respect_handler_level=True
+    )
+    _listener.start()
+
+    logger.addHandler(_LocalQueueHandler(log_queue))
 
     return logger
 
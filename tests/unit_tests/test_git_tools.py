@@ -0,0 +1,504 @@
+"""Unit tests for the git helpers in tools.git, run against throwaway repositories."""
+import subprocess
+import sys
+
+import pytest
+
+from tools import git
+
+
+def _git(cwd, *args):
+    subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True)
+
+
+@pytest.fixture
+def repo(tmp_path, monkeypatch):
+    monkeypatch.setenv("GIT_AUTHOR_NAME", "Test")
+    monkeypatch.setenv("GIT_AUTHOR_EMAIL", "test@example.com")
+    monkeypatch.setenv("GIT_COMMITTER_NAME", "Test")
+    monkeypatch.setenv("GIT_COMMITTER_EMAIL", "test@example.com")
+    # Keep git's messages in English for the assertions below
+    monkeypatch.setenv("LC_ALL", "C")
+    _git(tmp_path, "init", "-q")
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def test_spawn_and_drain_collects_both_pipes(tmp_path):
+    script = [sys.executable, "-c", "import sys; sys.stdout.write('o' * 200000); sys.stderr.write('e')"]
+
+    returncode, out, err = git._spawn_and_drain(script, tmp_path)
+
+    assert (returncode, out, err) == (0, b"o" * 200000, b"e")
+
+
+def test_spawn_and_drain_feeds_input_larger_than_pipe_buffer(tmp_path):
+    data = bytes(range(256)) * 4096
+    echo = [sys.executable, "-c", "import sys; sys.stdout.buffer.write(sys.stdin.buffer.read())"]
+
+    returncode, out, err = git._spawn_and_drain(echo, tmp_path, input=data)
+
+    assert (returncode, out, err) == (0, data, b"")
+
+
+def test_spawn_and_drain_empty_input_closes_stdin(tmp_path):
+    count = [sys.executable, "-c", "import sys; print(len(sys.stdin.buffer.read()))"]
+
+    returncode, out, _ = git._spawn_and_drain(count, tmp_path, input=b"")
+
+    assert (returncode, out.strip()) == (0, b"0")
+
+def test_spawn_and_drain_enforces_deadline(tmp_path):
+    sleep = [sys.executable, "-c", "import time; time.sleep(10)"]
+
+    with pytest.raises(subprocess.TimeoutExpired):
+        git._spawn_and_drain(sleep, tmp_path, timeout=0.2)
+
+def test_git_log_on_unborn_branch(repo):
+    assert git.git_log.func() == "No commits found"
+
+
+def test_git_log_outside_repository(tmp_path, monkeypatch):
+    monkeypatch.setenv("GIT_CEILING_DIRECTORIES", str(tmp_path))
+    monkeypatch.chdir(tmp_path)
+
+    assert "not a git repository" in git.git_log.func()
+
+
+@pytest.fixture
+def no_fallback(monkeypatch):
+    """Fail the test if run_git_bulk falls back to one git run per section"""
+    monkeypatch.setattr(
+        git, "run_git_command", lambda *a, **k: pytest.fail("run_git_bulk fell back")
+    )
+
+
+def test_run_git_bulk_splits_sections_and_exit_codes(repo, no_fallback):
+    (repo / "a.txt").write_text("a\n")
+    _git(repo, "add", "a.txt")
+
+    sections = git.run_git_bulk()
+
+    assert set(sections) == {"status", "diff", "log"}
+    assert sections["status"].success
+    assert "A  a.txt" in sections["status"].stdout
+    assert sections["diff"].success
+    assert "+a" in sections["diff"].stdout
+    # No commits yet: only the log section fails
+    assert sections["log"].returncode != 0
+    assert sections["log"].stderr
+
+
+def test_run_git_bulk_runs_only_requested_sections(repo, no_fallback):
+    _git(repo, "commit", "-q", "--allow-empty", "-m", "first")
+
+    sections = git.run_git_bulk(("log",))
+
+    assert list(sections) == ["log"]
+    assert sections["log"].stdout.endswith(" first")
+
+
+def test_run_git_bulk_falls_back_when_output_contains_separator(repo, monkeypatch):
+    _git(repo, "commit", "-q", "--allow-empty", "-m", "subject \x1e with separator")
+    fallback_calls = []
+    run_git_command = git.run_git_command
+    monkeypatch.setattr(
+        git,
+        "run_git_command",
+        lambda command, cwd=None: fallback_calls.append(command) or run_git_command(command, cwd),
+    )
+
+    sections = git.run_git_bulk()
+
+    assert len(fallback_calls) == len(git._BULK_SECTIONS)
+    assert sections["log"].success
+    assert "subject \x1e with separator" in sections["log"].stdout
+    assert sections["status"].success
+    assert sections["diff"].stdout == ""
+
+
+def test_run_git_bulk_outside_repository(tmp_path, monkeypatch):
+    monkeypatch.setenv("GIT_CEILING_DIRECTORIES", str(tmp_path))
+
+    sections = git.run_git_bulk(cwd=tmp_path)
+
+    assert all(not result.success for result in sections.values())
+
+
+@pytest.fixture
+def committed(repo):
+    (repo / "README.md").write_text("line 1\nline 2\n")
+    (repo / "app.py").write_text("x = 1\n")
+    _git(repo, "add", ".")
+    _git(repo, "commit", "-q", "-m", "initial")
+    git.clear_git_cache()
+    return repo
+
+
+def test_working_tree_diff_is_never_cached(committed):
+    assert git.run_git_command(["git", "diff"]).stdout == ""
+
+    (committed / "app.py").write_text("x = 2\n")
+
+    assert "+x = 2" in git.run_git_command(["git", "diff"]).stdout
+
+
+def test_staged_diff_is_cached_until_the_index_changes(committed):
+    first = git.run_git_command(["git", "diff", "--cached"])
+    assert git.run_git_command(["git", "diff", "--cached"]) is first
+
+    (committed / "app.py").write_text("x = 2\n")
+    _git(committed, "add", "app.py")
+
+    assert "+x = 2" in git.run_git_command(["git", "diff", "--cached"]).stdout
+
+
+def test_git_snapshot_matches_the_individual_tools(committed):
+    (committed / "app.py").write_text("x = 2\n")
+    expected = [
+        git.get_git_status.func(),
+        git.git_log.func(),
+        git.get_git_diff.func(),
+        git.read_commit_editmsg.func(),
+    ]
+
+    assert git.git_snapshot.func() == "\n\n".join(expected)
+
+
+def test_run_git_command_stream_yields_the_whole_output(committed):
+    (committed / "app.py").write_text("x = 2\n" * 50000)
+    _git(committed, "add", "app.py")
+    streamed = b"".join(git.run_git_command_stream(["git", "diff", "--cached"]))
+    assert streamed.decode() == git.run_git_command(["git", "diff", "--cached"]).stdout + "\n"
+
+
+def test_run_git_command_stream_raises_on_failure(tmp_path):
+    with pytest.raises(git.GitCommandError):
+        list(git.run_git_command_stream(["git", "log"], cwd=tmp_path))
+
+
+def test_staged_excerpt_stops_at_the_limit(committed):
+    (committed / "app.py").write_text("y = 'é'\n" * 50000)
+    _git(committed, "add", "app.py")
+    excerpt = git._staged_excerpt(1001)
+    assert excerpt.endswith("\n... [diff truncated]")
+    assert len(excerpt.encode()) <= 1001 + len("\n... [diff truncated]")
+    assert excerpt.startswith("diff --git a/app.py b/app.py")
+
+
+def test_staged_excerpt_small_diff_is_complete(committed):
+    (committed / "app.py").write_text("x = 2\n")
+    _git(committed, "add", "app.py")
+    assert git._staged_excerpt(1024) == git.run_git_command(["git", "diff", "--cached", "--unified=1"]).stdout + "\n"
+
+
+def test_staged_files_reports_renames_with_source(committed):
+    _git(committed, "mv", "README.md", "GUIDE.md")
+
+    assert git._staged_files() == [
+        {"path": "GUIDE.md", "status": "R100", "added": 0, "deleted": 0, "from": "README.md"},
+    ]
+
+
+def test_staged_files_binary_counts_are_none(committed):
+    (committed / "blob.bin").write_bytes(b"\x00\x01\x02")
+    _git(committed, "add", "blob.bin")
+
+    assert git._staged_files() == [
+        {"path": "blob.bin", "status": "A", "added": None, "deleted": None},
+    ]
+
+
+def test_staged_files_paths_are_not_c_quoted(committed):
+    (committed / "é, notes\t1.md").write_text("hi\n")
+    _git(committed, "mv", "app.py", "ünï.py")
+    _git(committed, "add", ".")
+
+    files = git._staged_files()
+
+    assert [(entry["path"], entry.get("from")) for entry in files] == [
+        ("é, notes\t1.md", None),
+        ("ünï.py", "app.py"),
+    ]
+
+
+def test_staged_changes_adds_summary_and_excerpt(committed):
+    (committed / "app.py").write_text("x = 2\n")
+    _git(committed, "add", "app.py")
+
+    staged = git._staged_changes(git._staged_files())
+
+    assert staged["files"][0]["path"] == "app.py"
+    assert staged["summary"] == "1 file changed, 1 insertion(+), 1 deletion(-)"
+    assert "+x = 2" in staged["excerpt"]
+
+
+
+def _cli(cwd, *args):
+    return subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True, text=True).stdout.strip()
+
+
+@pytest.fixture
+def libgit2():
+    pytest.importorskip("pygit2")
+
+
+def test_libgit2_status_matches_cli(committed, libgit2):
+    (committed / "app.py").write_text("x = 2\n")
+    (committed / "README.md").write_text("changed\n")
+    (committed / "new.txt").write_text("new\n")
+    _git(committed, "add", "README.md")
+
+    result = git._read_with_libgit2(git._libgit2_status)
+
+    assert result.stdout == _cli(committed, "status", "--porcelain", "-b")
+
+
+def test_libgit2_status_on_unborn_branch_with_slash(repo, libgit2):
+    _git(repo, "checkout", "-q", "-b", "feature/x")
+    (repo / "new.txt").write_text("new\n")
+
+    result = git._read_with_libgit2(git._libgit2_status)
+
+    assert result.stdout == _cli(repo, "status", "--porcelain", "-b")
+    assert result.stdout.startswith("## No commits yet on feature/x\n")
+
+
+def test_libgit2_log_matches_cli(committed, libgit2):
+    for i in range(3):
+        (committed / "app.py").write_text(f"x = {i}\n")
+        _git(committed, "commit", "-q", "-am", f"change {i}\n\nbody {i}")
+
+    result = git._read_with_libgit2(git._libgit2_log, 3)
+
+    assert result.stdout == _cli(committed, "log", "-3", "--oneline")
+
+
+def test_libgit2_diff_matches_cli(committed, libgit2):
+    (committed / "app.py").write_text("x = 2\n")
+    (committed / "README.md").write_text("line 1\nline 2\nline 3\n")
+    _git(committed, "add", "README.md")
+
+    assert git._read_with_libgit2(git._libgit2_diff, False).stdout == _cli(committed, "diff")
+    assert git._read_with_libgit2(git._libgit2_diff, True).stdout == _cli(committed, "diff", "--cached")
+
+
+def test_atomic_write_editmsg_replaces_the_file(tmp_path):
+    path = tmp_path / "COMMIT_EDITMSG"
+    path.write_text("old message that is longer\n")
+
+    git._atomic_write_editmsg(path, "feat: ünïcode")
+
+    assert path.read_text(encoding="utf-8") == "feat: ünïcode"
+    assert [p.name for p in tmp_path.iterdir()] == ["COMMIT_EDITMSG"]
+
+
+def test_ollama_reuses_the_registered_manager(monkeypatch):
+    monkeypatch.setattr(git, "_OLLAMA", None)
+    manager = object()
+
+    git.set_ollama_manager(manager)
+
+    assert git._ollama() is manager
+
+
+class _FakeLLM:
+    def __init__(self):
+        self.prompts = []
+
+    def invoke(self, prompt):
+        self.prompts.append(prompt)
+        return f"message {len(self.prompts)}"
+
+
+def test_generate_commit_msg_is_memoized_on_its_inputs(monkeypatch):
+    llm = _FakeLLM()
+    monkeypatch.setattr(git, "_ollama", lambda: type("Manager", (), {"llm": llm}))
+    git._clear_commit_msg_cache()
+
+    first = git._generate_commit_msg("diff", diff="+x = 1")
+    again = git._generate_commit_msg("diff", diff="+x = 1")
+    other = git._generate_commit_msg("diff", diff="+x = 2")
+
+    assert (first, again, other) == ("message 1", "message 1", "message 2")
+    assert len(llm.prompts) == 2
+    git._clear_commit_msg_cache()
+
+
+@pytest.mark.parametrize(
+    "files, expected",
+    [
+        ("app.py", ["app.py"]),
+        ("notes, draft.md", ["notes, draft.md"]),
+        (" leading space.txt", [" leading space.txt"]),
+        ('["a.py", "b, c.py"]', ["a.py", "b, c.py"]),
+        ("a.py\nb c.py\n", ["a.py", "b c.py"]),
+        ("[not json", ["[not json"]),
+        (["a.py", "b.py"], ["a.py", "b.py"]),
+        ("", []),
+    ],
+)
+def test_parse_paths(files, expected):
+    assert git._parse_paths(files) == expected
+
+
+def test_git_add_files_stages_a_list_in_one_call(committed):
+    for name in ("a.py", "b, c.py", "d.py"):
+        (committed / name).write_text("x\n")
+
+    result = git.git_add_files.func('["a.py", "b, c.py", "d.py"]')
+
+    assert result == "Successfully added 3 paths to staging area"
+    assert _cli(committed, "diff", "--cached", "--name-only").splitlines() == ["a.py", "b, c.py", "d.py"]
+
+
+def _popen_replacing_command(replacement):
+    popen = subprocess.Popen
+
+    def fake(command, **kwargs):
+        return popen(replacement, **kwargs)
+
+    return fake
+
+
+def test_run_git_command_stream_times_out_on_open_stderr(committed, monkeypatch):
+    # A child that closes stdout but holds stderr open must still hit the deadline
+    hang = [sys.executable, "-c", "import os, time; os.close(1); time.sleep(10)"]
+    monkeypatch.setattr(git, "_GIT_TIMEOUT", 0.2)
+    monkeypatch.setattr(git, "_ALLOWED", frozenset({"diff"}))
+    monkeypatch.setattr(git.subprocess, "Popen", _popen_replacing_command(hang))
+
+    with pytest.raises(git.GitCommandError, match="timed out"):
+        list(git.run_git_command_stream(["git", "diff"]))
+
+
+def test_git_result_decodes_stdout_once_on_first_read():
+    result = git.GitResult("git log", 0, "  naïve\n".encode("utf-8"))
+
+    assert result._stdout is None
+    assert result.stdout == "naïve"
+    assert result.stdout is result.stdout
+    assert result.success
+
+
+@pytest.fixture
+def tracking(committed, tmp_path_factory):
+    """committed, pushed to a bare origin with its branch tracking origin"""
+    origin = tmp_path_factory.mktemp("origin")
+    _git(origin, "init", "-q", "--bare")
+    _git(committed, "remote", "add", "origin", str(origin))
+    _git(committed, "push", "-q", "-u", "origin", "HEAD")
+    return committed
+
+
+def _diverge(repo):
+    """Add one commit on origin and one local commit, then fetch"""
+    branch = _cli(repo, "branch", "--show-current")
+    other = repo.parent / f"{repo.name}-other"
+    _git(repo.parent, "clone", "-q", _cli(repo, "remote", "get-url", "origin"), str(other))
+    (other / "remote.txt").write_text("remote\n")
+    _git(other, "add", "remote.txt")
+    _git(other, "commit", "-q", "-m", "remote change")
+    _git(other, "push", "-q", "origin", branch)
+    _git(repo, "commit", "-q", "--allow-empty", "-m", "local change")
+    _git(repo, "fetch", "-q")
+
+
+def test_libgit2_status_reports_in_sync_upstream(tracking, libgit2):
+    result = git._read_with_libgit2(git._libgit2_status)
+
+    assert result.stdout == _cli(tracking, "status", "--porcelain", "-b")
+    assert "..." in result.stdout
+
+
+def test_libgit2_status_reports_ahead_and_behind(tracking, libgit2):
+    _diverge(tracking)
+
+    result = git._read_with_libgit2(git._libgit2_status)
+
+    assert result.stdout == _cli(tracking, "status", "--porcelain", "-b")
+    assert result.stdout.endswith(" [ahead 1, behind 1]")
+
+
+def test_libgit2_status_reports_gone_upstream(tracking, libgit2):
+    branch = _cli(tracking, "branch", "--show-current")
+    _git(tracking, "update-ref", "-d", f"refs/remotes/origin/{branch}")
+
+    result = git._read_with_libgit2(git._libgit2_status)
+
+    assert result.stdout == _cli(tracking, "status", "--porcelain", "-b")
+    assert result.stdout.endswith(" [gone]")
+
+
+@pytest.mark.parametrize("mode", ["no", "normal", "all"])
+def test_status_untracked_files_mode_applies_to_both_paths(committed, monkeypatch, mode):
+    (committed / "docs").mkdir()
+    (committed / "docs" / "new.md").write_text("new\n")
+    monkeypatch.setattr(git.settings, "status_untracked_files", mode)
+    expected = _cli(committed, "status", "--porcelain", "-b", f"--untracked-files={mode}")
+
+    monkeypatch.setattr(git, "_read_with_libgit2", lambda *args: None)
+    assert git.get_git_status.func() == git._status_report(git.GitResult("", 0, expected.encode()))
+
+    if git.pygit2 is not None:
+        assert git._libgit2_status(git._libgit2_repo()).stdout == expected
+
+
+def _change(path, status="M", added=1, deleted=0, **extra):
+    return {"path": path, "status": status, "added": added, "deleted": deleted, **extra}
+
+
+@pytest.mark.parametrize(
+    "files, expected",
+    [
+        ([_change("docs/guide.md", added=2, deleted=1)], "docs: update docs/guide.md"),
+        ([_change("new.md", "R100", 0, 0, **{"from": "old.md"})], "chore: rename old.md → new.md"),
+        ([_change("app.py", added=1, deleted=1)], "fix: tweak app.py"),
+    ],
+)
+def test_trivial_commit_msg_rules(files, expected):
+    assert git._trivial_commit_msg(files) == expected
+
+
+@pytest.mark.parametrize(
+    "files",
+    [
+        # More than one file
+        [_change("a.md"), _change("b.md")],
+        # More than three lines changed
+        [_change("a.md", added=3, deleted=1)],
+        # Binary
+        [_change("logo.png", added=None, deleted=None)],
+        # Rename that also edits the file
+        [_change("b.py", "R090", 1, 0, **{"from": "a.py"})],
+        # Added rather than modified
+        [_change("new.md", "A")],
+        # More than one line on each side of a .py edit
+        [_change("app.py", added=2, deleted=0)],
+        # No rule for other file types
+        [_change("config.toml")],
+    ],
+)
+def test_trivial_commit_msg_falls_through_to_llm(files):
+    assert git._trivial_commit_msg(files) is None
+
+
+def test_generate_commit_message_skips_llm_and_diff_for_trivial_change(committed, monkeypatch):
+    (committed / "README.md").write_text("line 1\nline 2 edited\n")
+    _git(committed, "add", "README.md")
+    monkeypatch.setattr(git, "_staged_changes", lambda files: pytest.fail("diff excerpt fetched"))
+    monkeypatch.setattr(git, "_generate_commit_msg", lambda *a, **k: pytest.fail("LLM called"))
+
+    result = git.generate_commit_message.func()
+
+    assert result.endswith("docs: update README.md")
+    assert (committed / ".git" / "COMMIT_EDITMSG").read_text() == "docs: update README.md"
+
+
+def test_generate_commit_message_uses_llm_when_skip_disabled(committed, monkeypatch):
+    (committed / "README.md").write_text("line 1\nline 2 edited\n")
+    _git(committed, "add", "README.md")
+    monkeypatch.setattr(git.settings, "llm_skip_trivial", False)
+    monkeypatch.setattr(git, "_generate_commit_msg", lambda style, **inputs: "docs: from llm")
+
+    assert git.generate_commit_message.func().endswith("docs: from llm")